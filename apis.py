@@ -1,28 +1,61 @@
 #!/usr/bin/env python3
 from abc import ABC, abstractmethod
 import base64
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import functools
 import json
 import hashlib
 import hmac
+from http.cookiejar import DefaultCookiePolicy
+import threading
 import time
 import urllib.parse
 
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import make_headers, Retry
+try:
+    from orjson import dumps as json_dumps, loads as json_loads
+except ImportError:
+    from json import loads as json_loads
 
+    def json_dumps(obj) -> bytes:
+        """ Compact JSON serialization, as orjson.dumps."""
+        return json.dumps(obj, separators=(',', ':')).encode()
+
+'Session shared by API instances created without their own'
+_shared_session = None
 
-class Api(ABC):
-    col_names = ['Asset', 'Amount', 'price_f', 'price_c']
 
-    def __init__(self, path: str = '') -> None:
+class Api(ABC):
+    'Columns of the balance records'
+    col_names = ['API', 'Asset', 'Amount', 'price_f', 'price_c']
+    'Seconds during which a fetched price is reused'
+    cache_ttl = 5
+    'Maximum number of concurrent price requests'
+    max_workers = 16
+    'Hash used to sign private requests, None if there are none'
+    hmac_digest = None
+    'Calls allowed per sliding window of seconds, None if not limited'
+    rate_limit = None
+
+    def __init__(self, path: str = '',
+                 session: requests.Session = None) -> None:
         """ Initialize session w/ API and load optional keys.
 
         Args:
         - path: Path to file with key and secret, each on a line
+        - session: Session to use, by default one shared by all instances
         """
         self.load_key(path)
-        self.session = requests.Session()
+        self.session = session or Api._get_shared_session()
         self.balance = None
+        self._ticker_cache = {}
+        self._nonce_ctr = 0
+        self._calls = deque()
+        self._calls_lock = threading.Lock()
 
     def load_key(self, path: str, addr_path: str = '') -> None:
         """ Load key and secret or address from file(s).
@@ -51,24 +84,125 @@ class Api(ABC):
                 print('Warning: File with address not found')
                 self.key = self.secret = self.address = ''
 
+        # Signing HMAC keyed with the new secret on next signature
+        self._hmac_template = None
+
+    def _hmac(self) -> hmac.HMAC:
+        """ Return a copy of the signing HMAC, keyed once with the secret.
+
+        Keying is deferred to the first signature, so that a malformed secret
+        does not prevent public calls.
+        """
+        if self._hmac_template is None:
+            self._hmac_template = hmac.new(self._hmac_key(),
+                                           digestmod=self.hmac_digest)
+        return self._hmac_template.copy()
+
+    def _hmac_key(self) -> bytes:
+        """ Return secret as the bytes keying the signing HMAC."""
+        return self.secret.encode('utf8')
+
     @staticmethod
-    def _balance_to_dataframe(balance: dict, api_name: str) -> pd.DataFrame:
-        '''Convert dictionary balance into a pandas dataframe.'''
-        df = pd.DataFrame.from_dict(balance, orient = 'index', dtype='float')
-        df.reset_index(inplace = True)
-        df.columns = Api.col_names
-        df['API'] = api_name
-        df = df[['API'] + Api.col_names]
+    def _open_session() -> requests.Session:
+        """ Return a session keeping its connections alive between requests.
+
+        Connections are pooled and reused, so that only the first request to
+        a host pays for the TCP and TLS handshakes.
+        """
+        session = requests.Session()
+        # Compressed bodies, with every encoding urllib3 can decode here
+        session.headers.update(make_headers(accept_encoding=True))
+        session.headers.update({'Connection': 'keep-alive'})
+
+        # APIs are stateless, no cookie needs to be kept
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+        # Retry rate limits and transient server errors, and keep a large
+        # enough pool for concurrent requests to reuse connections. 500 is
+        # left out, as Bitfinex answers unknown pairs with it. Once retries
+        # are exhausted the last response is returned, for raise_for_status
+        # to raise HTTPError as without retries
+        retries = Retry(total=3, backoff_factor=0.3,
+                        status_forcelist=[429, 502, 503, 504],
+                        raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=32, pool_maxsize=32,
+                              max_retries=retries)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    @staticmethod
+    def _get_shared_session() -> requests.Session:
+        """ Return the session shared by all API instances.
+
+        Sharing it lets every exchange and account reuse the same connection
+        pool, DNS lookups and TLS sessions.
+        """
+        global _shared_session
+        if _shared_session is None:
+            _shared_session = Api._open_session()
+        return _shared_session
+
+    @staticmethod
+    def _balance_records(balance: dict, api_name: str) -> list:
+        """ Convert dictionary balance into (API, Asset, Amount, price_f,
+        price_c) records, to be stacked with other APIs' in a single frame.
+
+        Args:
+        - balance: {<Asset>: [<Amount>, <price_f>, <price_c>]}
+        - api_name: name of the API reported in the records
+        """
+        return [(api_name, asset, *map(float, row))
+                for (asset, row) in balance.items()]
+
+    def _cache_get(self, cache: dict, key):
+        """ Return value cached under key, or None if missing or stale."""
+        hit = cache.get(key)
+        if hit is not None and time.monotonic() - hit[0] < self.cache_ttl:
+            return hit[1]
+        return None
+
+    @staticmethod
+    def _cache_set(cache: dict, key, value):
+        """ Cache value under key with the current timestamp."""
+        cache[key] = (time.monotonic(), value)
+        return value
 
-        return df
-        
     def _nonce(self) -> int:
-        """ Nonce counter."""
-        return int(1000 * time.time())
+        """ Nonce counter, strictly increasing even within the same ms and
+        across threads."""
+        with self._calls_lock:
+            return self._next_nonce()
+
+    def _next_nonce(self) -> int:
+        """ Increment nonce counter, _calls_lock being held."""
+        self._nonce_ctr = max(self._nonce_ctr + 1, int(1000 * time.time()))
+        return self._nonce_ctr
+
+    def _throttle(self) -> int:
+        """ Block until rate_limit allows one more call, then record it and
+        return a nonce for it.
+
+        Calls made beyond the limit would be answered with HTTP 429 and
+        retried with backoff, which is slower than waiting for a slot. The
+        nonce is issued under the same lock, so that nonces follow the order
+        in which slots are granted.
+        """
+        with self._calls_lock:
+            if self.rate_limit is not None:
+                calls, window = self.rate_limit
+                now = time.monotonic()
+                while self._calls and now - self._calls[0] >= window:
+                    self._calls.popleft()
+                if len(self._calls) >= calls:
+                    time.sleep(window - (now - self._calls.popleft()))
+                    now = time.monotonic()
+                self._calls.append(now)
+            return self._next_nonce()
 
     @abstractmethod    
-    def get_balance(self) -> pd.DataFrame:
-        """ Get balance of holdings from an API source."""
+    def get_balance(self) -> list:
+        """ Get balance of holdings from an API source, as records."""
         pass
 
     @abstractmethod
@@ -82,7 +216,67 @@ class Api(ABC):
         pass
 
 
-class Kraken(Api):
+class Exchange(Api):
+    """ API source trading digital assets, hence able to price them."""
+
+    def __init__(self, path: str = '',
+                 session: requests.Session = None) -> None:
+        """ Initialize session w/ API, load optional keys and price cache.
+
+        Args:
+        - path: Path to file with key and secret, each on a line
+        - session: Session to use, by default one shared by all instances
+        """
+        super().__init__(path, session)
+        self._price_cache = {}
+
+    def get_price(self, ticker: str, base_fiat: str,
+                  base_crypto: str = '') -> tuple:
+        """ Return last trade price of ticker in base fiat or crypto.
+
+        Prices are kept for cache_ttl seconds, so that repeated lookups of the
+        same ticker do not go over the network again.
+
+        Args:
+        - ticker: Ticker of digital asset
+        - base_fiat: currency in which the holdings are reported
+        - base_crypto: digital asset in which the holdings are reported
+        """
+        key = (ticker, base_fiat, base_crypto)
+        prices = self._cache_get(self._price_cache, key)
+        if prices is not None:
+            return prices
+        return self._cache_set(self._price_cache, key,
+                               self._get_price(ticker, base_fiat, base_crypto))
+
+    @abstractmethod
+    def _get_price(self, ticker: str, base_fiat: str,
+                   base_crypto: str = '') -> tuple:
+        """ Fetch last trade price of ticker from the exchange."""
+        pass
+
+    def get_prices(self, tickers, base_fiat: str,
+                   base_crypto: str = '') -> dict:
+        """ Return last trade prices of tickers, fetched concurrently.
+
+        Requests are I/O-bound, so they are spread over max_workers threads
+        sharing the session: the wall time is that of the slowest ticker
+        rather than the sum of all round trips.
+
+        Args:
+        - tickers: Tickers of digital assets
+        - base_fiat: currency in which the holdings are reported
+        - base_crypto: digital asset in which the holdings are reported
+        """
+        tickers = list(tickers)
+        with ThreadPoolExecutor(self.max_workers) as ex:
+            prices = ex.map(
+                    lambda t: self.get_price(t, base_fiat, base_crypto),
+                    tickers)
+            return dict(zip(tickers, prices))
+
+
+class Kraken(Exchange):
     """ Maintain a single session betwen this machine and Kraken.
 
     Inspired by Krakenex:
@@ -90,7 +284,7 @@ class Kraken(Api):
     """
     uri = "https://api.kraken.com/"
     api_version = "0"
-    public_methods = (
+    public_methods = frozenset({
                    "Time",
                    "Assets",
                    "AssetPairs",
@@ -99,11 +293,19 @@ class Kraken(Api):
                    "Depth",
                    "Trades",
                    "Spread"
-                   )
+                   })
+    hmac_digest = hashlib.sha512
+    # Private calls of starter tier: counter of 15, decreasing by 1 every 3s
+    rate_limit = (15, 45)
+    'Seconds during which the listed asset pairs are reused'
+    asset_pairs_ttl = 3600
+    _pairs = None
+    _pairs_time = 0
 
     def close(self) -> None:
-        """ Close this session. """
-        self.session.close()
+        """ Close this session, unless it is shared with other instances. """
+        if self.session is not _shared_session:
+            self.session.close()
         print("Kraken session closed.")
 
     def query(self, method: str, data: dict = {}, headers: dict = {}):
@@ -116,13 +318,20 @@ class Kraken(Api):
         """
         # Public Query
         if method in Kraken.public_methods:
+            # Same pairs are often asked for several times in a row
+            if method == 'Ticker':
+                key = frozenset(data.items())
+                res = self._cache_get(self._ticker_cache, key)
+                if res is not None:
+                    return res
             url = Kraken.uri + Kraken.api_version + "/public/" + method
 
         # Private Query
         else:
             if not self.key or not self.secret:
                 raise Exception("At least one of key or secret is not set.")
-            data['nonce'] = self._nonce()
+            # Nonce issued with the rate limit slot, in the order granted
+            data['nonce'] = self._throttle()
             urlpath = "/" + Kraken.api_version + "/private/" + method
             headers = {
                     'API-Key': self.key,
@@ -134,7 +343,15 @@ class Kraken(Api):
         response = self.session.post(url, data=data, headers=headers)
         if response.status_code not in (200, 201, 202):
             response.raise_for_status()
-        return response.json()['result']
+        res = json_loads(response.content)['result']
+
+        if method == 'Ticker':
+            self._cache_set(self._ticker_cache, frozenset(data.items()), res)
+        return res
+
+    def _hmac_key(self) -> bytes:
+        """ Return secret as the bytes keying the signing HMAC."""
+        return base64.b64decode(self.secret)
 
     def _sign(self, data: dict, urlpath: str) -> str:
         """ Return signature digest according to Kraken' scheme.
@@ -143,16 +360,20 @@ class Kraken(Api):
         - data: API request parameters
         - urlpath: API URL path w/o uri
         """
-        postdata = urllib.parse.urlencode(data)
+        # Url-encoded data, nonce and path are ASCII only
+        postdata = urllib.parse.urlencode(data).encode('ascii')
 
-        encoded = (str(data['nonce']) + postdata).encode()
-        msg = urlpath.encode() + hashlib.sha256(encoded).digest()
+        # SHA256(nonce + postdata), fed incrementally to avoid concatenation
+        sha = hashlib.sha256(str(data['nonce']).encode('ascii'))
+        sha.update(postdata)
+        msg = urlpath.encode('ascii') + sha.digest()
 
-        sig = hmac.new(base64.b64decode(self.secret), msg, hashlib.sha512)
+        sig = self._hmac()
+        sig.update(msg)
         sig_digest = base64.b64encode(sig.digest())
         return sig_digest.decode()
 
-    def get_balance(self, base_fiat: str = '', base_crypto: str = '') -> pd.DataFrame:
+    def get_balance(self, base_fiat: str = '', base_crypto: str = '') -> list:
         """ Get balance of holdings from an API source.
 
         Args:
@@ -167,78 +388,98 @@ class Kraken(Api):
 
         # Remove zero values
         balance = {
-                Kraken.clean_ticker(crypto): [float(amount)]
-                for (crypto, amount) in balance.items()
-                if float(amount) != 0
+                crypto: [amount]
+                for (crypto, raw) in balance.items()
+                if (amount := float(raw)) != 0
                 }
 
         # Remove Kraken Fees
         balance.pop('KFEE', None)
 
         if base_fiat or base_crypto:
-            for ticker in balance:
-                # Get prices
-                prices = self.get_price(
-                                        ticker,
-                                        self.base_fiat,
-                                        self.base_crypto
-                                        )
-                prices = [float(price) for price in prices]
-                balance[ticker] = balance[ticker] + prices
-                                           
+            all_prices = self.get_prices(balance, base_fiat, base_crypto)
+            for crypto, prices in all_prices.items():
+                balance[crypto] += prices
+
+        # Report holdings under their clean ticker, staked ones apart
+        balance = {
+                (crypto if crypto.endswith('.S')
+                 else Kraken.clean_ticker(crypto)): row
+                for (crypto, row) in balance.items()
+                }
+
         if 'XBT' in balance:
             balance['BTC'] = balance.pop('XBT')
 
-        self.balance = Api._balance_to_dataframe(balance, 'Kraken')
+        self.balance = Api._balance_records(balance, 'Kraken')
 
         return self.balance
 
-    def get_price(
-                 self, ticker: str, base_fiat: str, base_crypto: str = ''
-                 ) -> tuple:
-        """ Return last trade price of ticker in base fiat or crypto.
+    def get_prices(self, tickers, base_fiat: str,
+                   base_crypto: str = '') -> dict:
+        """ Return last trade prices of tickers in base fiat or crypto.
 
-        Note: Potential issues when multiple pairs in one query, so base_fiat
-        and base_crypto queries are called separately.
+        Ticker accepts many pairs at once, so all fiat prices are fetched in
+        one query, whatever the number of tickers. Crypto prices are derived
+        from them through the fiat price of base_crypto, so that no crypto
+        pair is needed.
 
         Args:
-        - ticker: Ticker of digital asset
+        - tickers: Tickers of digital assets, cleaned or as Kraken names them
         - base_fiat: currency in which the holdings are reported
         - base_crypto: digital asset in which the holdings are reported
         """
-        # Handle when ticker is fiat
-        if ticker in ('EUR', 'USD'):
-            if base_crypto:
-                return 1, 0
-            else:
-                return 1, 0
-
-        # Clean staking tickers
-        if ticker.endswith('.S'):
-            ticker = ticker[:-2]
-
-        data = {'pair': ticker + base_fiat}
-        res = self.query('Ticker', data)
-        fiat_price = res[list(res.keys())[0]]['c'][0]
-
-        # Just fiat value asked
-        if not base_crypto:
-            return fiat_price, 0
+        if base_crypto == 'BTC':
+            base_crypto = 'XBT'
 
-        if base_crypto == ticker:
-            return (fiat_price, 1)
+        # Asset each ticker is priced as, e.g. XXBT -> XBT, DOT.S -> DOT
+        assets = {}
+        for ticker in tickers:
+            asset = Kraken.clean_ticker(ticker)
+            assets[ticker] = 'XBT' if asset == 'BTC' else asset
+        cryptos = set(assets.values()) - {'EUR', 'USD'}
+
+        # Kraken pair of each price asked, e.g. XBT in USD -> XXBTZUSD
+        pairs = {asset: self.resolve(asset, base_fiat)
+                 for asset in cryptos | ({base_crypto} - {''})}
+
+        # Get all prices in one query
+        res = {}
+        if pairs:
+            names = sorted({pair for (pair, _) in pairs.values()})
+            res = self.query('Ticker', {'pair': ','.join(names)})
+        fiat_prices = {asset: Kraken._pair_price(res, *pair)
+                       for (asset, pair) in pairs.items()}
+
+        prices = {}
+        for ticker, asset in assets.items():
+            # Handle when ticker is fiat
+            if asset not in cryptos:
+                prices[ticker] = (1, 0)
+                continue
+
+            fiat_price = fiat_prices[asset]
+            if not base_crypto:
+                crypto_price = 0
+            elif asset == base_crypto:
+                crypto_price = 1
+            else:
+                crypto_price = fiat_price / fiat_prices[base_crypto]
+            prices[ticker] = (fiat_price, crypto_price)
 
-        if base_crypto == 'ETH' and ticker == 'XBT':
-            data_crypto = {'pair': 'ETHXBT'}
-            res = self.query('Ticker', data_crypto)
-            crypto_price = 1/float(res[list(res.keys())[0]]['c'][0])
+        return prices
 
-        else:
-            data_crypto = {'pair': ticker + base_crypto}
-            res = self.query('Ticker', data_crypto)
-            crypto_price = res[list(res.keys())[0]]['c'][0]
+    def _get_price(
+                  self, ticker: str, base_fiat: str, base_crypto: str = ''
+                  ) -> tuple:
+        """ Return last trade price of ticker in base fiat or crypto.
 
-        return (fiat_price, crypto_price)
+        Args:
+        - ticker: Ticker of digital asset
+        - base_fiat: currency in which the holdings are reported
+        - base_crypto: digital asset in which the holdings are reported
+        """
+        return self.get_prices([ticker], base_fiat, base_crypto)[ticker]
 
     def get_history(self, ticker: str, interval: int=1440) -> pd.DataFrame:
         '''Return historical OHLC data in a dataframe.
@@ -259,7 +500,7 @@ class Kraken(Api):
         res.pop('last', None)
         
         # Result to dataframe
-        key = list(res.keys())[0]
+        key = next(iter(res))
         col_names = ('time', 'open', 'high', 'low', 'close', 'vwap', 'volume', 'count')
         df = pd.DataFrame(res[key], columns=col_names)
 
@@ -270,19 +511,76 @@ class Kraken(Api):
         df = df.astype(float)
         return df
 
+    def resolve(self, base: str, quote: str) -> tuple:
+        """ Return Kraken pair name of base/quote and whether it is inverted.
+
+        E.g. ('XBT', 'USD') -> ('XXBTZUSD', False) and, as only ETH/XBT is
+        listed, ('XBT', 'ETH') -> ('XETHXXBT', True).
+
+        Args:
+        - base: clean ticker of the asset priced
+        - quote: clean ticker of the asset the price is expressed in
+        """
+        pairs = self._asset_pairs()
+        if (base, quote) in pairs:
+            return pairs[(base, quote)], False
+        if (quote, base) in pairs:
+            return pairs[(quote, base)], True
+        raise KeyError(f'No Kraken pair for {base}/{quote}')
+
+    def _asset_pairs(self) -> dict:
+        """ Return Kraken pair names keyed by their (base, quote) tickers.
+
+        Pairs are listed once for all instances and kept for asset_pairs_ttl
+        seconds, as they seldom change.
+        """
+        if (Kraken._pairs is None or time.monotonic() - Kraken._pairs_time
+                >= Kraken.asset_pairs_ttl):
+            pairs = {}
+            for pair, info in self.query('AssetPairs').items():
+                # Skip dark pool pairs, e.g. XXBTZUSD.d
+                if pair.endswith('.d'):
+                    continue
+                key = (Kraken.clean_ticker(info['base']),
+                       Kraken.clean_ticker(info['quote']))
+                pairs.setdefault(key, pair)
+            Kraken._pairs = pairs
+            Kraken._pairs_time = time.monotonic()
+        return Kraken._pairs
+
+    @staticmethod
+    def _pair_price(res: dict, pair: str, inverted: bool = False) -> float:
+        """ Return last trade price of a pair from a Ticker result.
+
+        Args:
+        - res: result of a (multi-pair) Ticker query
+        - pair: Kraken pair name, as returned by resolve
+        - inverted: whether the price of the reverse pair is wanted
+        """
+        price = float(res[pair]['c'][0])
+        return 1/price if inverted else price
+
     @staticmethod
+    @functools.lru_cache(maxsize=256)
     def clean_ticker(ticker: str) -> str:
-        """ Clean ticker so we can use it for other API calls."""
+        """ Clean ticker so we can use it for other API calls.
+
+        Drops both the staking suffix and the legacy X/Z prefix, e.g.
+        DOT.S -> DOT and XXBT -> XBT.
+        """
+        if ticker.endswith('.S'):
+            ticker = ticker[:-2]
         if len(ticker) == 4 and ticker[0] in ('X', 'Z'):
             return ticker[1:]
         else:
             return ticker
 
 
-class Bitfinex(Api):
+class Bitfinex(Exchange):
     """ Maintain a single session betwen this machine and Bitfinex."""
     uri = "https://api-pub.bitfinex.com/v2/"
-    public_methods = (
+    ticker_uri = uri + "ticker/t"
+    public_methods = frozenset({
                    'platform/status',
                    'tickers',
                    'Trades',
@@ -297,21 +595,24 @@ class Bitfinex(Api):
                    'pulse/profile',
                    'calc/trade/avg',
                    'calc/fx'
-                   )
+                   })
     'Crytpo that will be ignored, to keep updated'
     shitcoins = ('ATD', 'ADD', 'MTO', 'MQX', 'IQX')
+    hmac_digest = hashlib.sha384
+    rate_limit = (30, 60)
 
-    def _sign(self, data: dict, urlpath: str) -> dict:
+    def _sign(self, data: dict, urlpath: str, nonce: int = None) -> dict:
         """ Return signature digest according to Bitfinex's scheme.
 
         Args:
         - data: API request parameters
         - urlpath: API URL path w/o uri
+        - (optional) nonce: nonce of the request, a new one by default
         """
-        nonce = str(self._nonce())
+        nonce = str(nonce or self._nonce())
         signature = f'/api/v2/{urlpath}{nonce}{data}'
-        h = hmac.new(self.secret.encode('utf8'), signature.encode('utf8'),
-                     hashlib.sha384)
+        h = self._hmac()
+        h.update(signature.encode('utf8'))
         signature = h.hexdigest()
 
         return {
@@ -329,13 +630,14 @@ class Bitfinex(Api):
         - params: API request optional parameters
         """
         url = f'{Bitfinex.uri}{method}'
-        data = json.dumps(data)
-        headers = self._sign(data, method)
+        # Most calls have no parameters, no need to serialize an empty dict
+        body = json_dumps(data).decode() if data else '{}'
+        headers = self._sign(body, method, self._throttle())
         headers['content-type'] = 'application/json'
-        response = self.session.post(url + params, headers=headers, data=data)
+        response = self.session.post(url + params, headers=headers, data=body)
         if response.status_code not in (200, 201, 202):
             response.raise_for_status()
-        return json.loads(response.text)
+        return json_loads(response.content)
 
     def fetch(self, method: str, params: str = "") -> list:
         """ GET query to Bitfinex's API.
@@ -345,12 +647,33 @@ class Bitfinex(Api):
         - params: API request optional parameters
         """
         url = f'{Bitfinex.uri}{method}{params}'
+        self._throttle()
         response = self.session.get(url)
         if response.status_code not in (200, 201, 202):
             response.raise_for_status()
-        return json.loads(response.text)
+        return json_loads(response.content)
 
-    def get_balance(self, base_fiat: str = '', base_crypto: str = '') -> dict:
+    def _get_ticker(self, pair: str) -> list:
+        """ GET ticker of a trading pair, e.g. BTCUSD.
+
+        Tickers are cached, as cross pairs (e.g. EURUSD) are shared by all
+        assets converted through them.
+
+        Args:
+        - pair: trading pair w/o the 't' prefix
+        """
+        ticker = self._cache_get(self._ticker_cache, pair)
+        if ticker is not None:
+            return ticker
+
+        self._throttle()
+        response = self.session.get(Bitfinex.ticker_uri + pair)
+        if response.status_code not in (200, 201, 202):
+            response.raise_for_status()
+        return self._cache_set(self._ticker_cache, pair,
+                               json_loads(response.content))
+
+    def get_balance(self, base_fiat: str = '', base_crypto: str = '') -> list:
         """ Get balance of holdings from a API source.
 
         Args:
@@ -369,21 +692,33 @@ class Bitfinex(Api):
         self.base_crypto = base_crypto
 
         if base_fiat or base_crypto:
-            for ticker in balance:
-                # Get prices
-                prices = self.get_price(ticker,
-                                        self.base_fiat,
-                                        self.base_crypto
-                                        )
-                prices = [float(price) for price in prices]
-                balance[ticker] = balance[ticker] + prices
+            all_prices = self.get_prices(balance, self.base_fiat,
+                                         self.base_crypto)
+            for ticker, prices in all_prices.items():
+                balance[ticker].extend(prices)
 
-        self.balance = Api._balance_to_dataframe(balance, 'Bitfinex')
+        self.balance = Api._balance_records(balance, 'Bitfinex')
 
         return self.balance
 
-    def get_price(self, ticker: str, base_fiat: str,
-                  base_crypto: str = "") -> tuple:
+    def get_prices(self, tickers, base_fiat: str,
+                   base_crypto: str = '') -> dict:
+        """ Return last trade prices of tickers in base fiat or crypto.
+
+        The fiat price of base_crypto, through which all crypto prices are
+        derived, is fetched once beforehand so that threads share it.
+
+        Args:
+        - tickers: Tickers of digital assets
+        - base_fiat: currency in which the holdings are reported
+        - base_crypto: digital asset in which the holdings are reported
+        """
+        if base_crypto:
+            self._fiat_price(base_crypto, base_fiat)
+        return super().get_prices(tickers, base_fiat, base_crypto)
+
+    def _get_price(self, ticker: str, base_fiat: str,
+                   base_crypto: str = "") -> tuple:
         """ Return last trade price of ticker in base fiat or crypto.
 
         Args:
@@ -393,22 +728,9 @@ class Bitfinex(Api):
         """
         # Handle when ticker is fiat
         if ticker in ('EUR', 'USD'):
-            if base_crypto:
-                return 1, 0
-            else:
-                return 1, 0
+            return 1, 0
 
-        # Fetch price
-        try:
-            method = f'ticker/t{ticker}{base_fiat}'
-            fiat_price = self.fetch(method)[6]
-        # Handle case where ticker not available in base_fiat
-        except requests.exceptions.HTTPError:
-            if base_crypto != 'USD':
-                fiat_price = (self.fetch(f'ticker/t{ticker}USD')[6] /
-                              self.fetch(f'ticker/t{base_fiat}USD')[0])
-            else:
-                raise requests.exceptions.HTTPError
+        fiat_price = self._fiat_price(ticker, base_fiat)
 
         # Just fiat value asked
         if not base_crypto:
@@ -417,16 +739,28 @@ class Bitfinex(Api):
         if base_crypto == ticker:
             return (fiat_price, 1)
 
-        if base_crypto == 'ETH' and ticker == 'BTC':
-            method = f'ticker/t{base_crypto}{ticker}'
-            crypto_price = 1/float(self.fetch(method)[6])
-
-        else:
-            method = f'ticker/t{ticker}{base_crypto}'
-            crypto_price = self.fetch(method)[6]
+        # Cross through fiat, as not all assets trade against base_crypto
+        crypto_price = fiat_price / self._fiat_price(base_crypto, base_fiat)
 
         return (fiat_price, crypto_price)
 
+    def _fiat_price(self, ticker: str, base_fiat: str) -> float:
+        """ Return last trade price of ticker in base fiat.
+
+        Args:
+        - ticker: Ticker of digital asset
+        - base_fiat: currency in which the price is expressed
+        """
+        try:
+            return self._get_ticker(ticker + base_fiat)[6]
+        # Handle case where ticker not available in base_fiat
+        except requests.exceptions.HTTPError:
+            if base_fiat != 'USD':
+                return (self._get_ticker(ticker + 'USD')[6] /
+                        self._get_ticker(base_fiat + 'USD')[0])
+            else:
+                raise
+
     def get_history(self, ticker: str, interval: str='1D') -> pd.DataFrame:
         '''Return historical OHLC data in a dataframe.
 
@@ -454,23 +788,25 @@ class Etherscan(Api):
     """ Maintain a single session between this machine and Etherscan. """
     uri = "https://api.etherscan.io/api"
 
-    def __init__(self, key_path: str = 'etherscan.key', addr_path: str = 'eth_addr') -> None:
+    def __init__(self, key_path: str = 'etherscan.key', addr_path: str = 'eth_addr',
+                 session: requests.Session = None) -> None:
         """ Initialize session w/ API and load key and ETH addresses.
 
         Note: At the moment, it allows only one Ethereum address to be loaded.
 
         Args:
         - key_path: Path to file with API key.
-        - addr_path: Path to file with Ethereum address."""
+        - addr_path: Path to file with Ethereum address.
+        - session: Session to use, by default one shared by all instances"""
 
         self.load_key(key_path, addr_path)
-        self.session = requests.Session()
+        self.session = session or Api._get_shared_session()
 
     def _sign(self):
         """ Not applicable for Etherscan API """
         pass
 
-    def get_balance(self) -> pd.DataFrame:
+    def get_balance(self) -> list:
         """ Get amount of ETH at address."""
         params = {
                'module': 'account',
@@ -485,9 +821,9 @@ class Etherscan(Api):
             response.raise_for_status()
 
         balance = {}
-        balance['ETH'] = [float(json.loads(response.text)['result'])/1e18] + [0, 0]
+        balance['ETH'] = [float(json_loads(response.content)['result'])/1e18] + [0, 0]
 
-        self.balance = Api._balance_to_dataframe(balance, 'Etherscan')
+        self.balance = Api._balance_records(balance, 'Etherscan')
         return self.balance
 
 class Blockchain(Api):
@@ -495,23 +831,25 @@ class Blockchain(Api):
     """
     uri = "https://blockchain.info/q/"
 
-    def __init__(self, addr_path: str = 'btc_addr') -> None:
+    def __init__(self, addr_path: str = 'btc_addr',
+                 session: requests.Session = None) -> None:
         """ Initialize session w/ API and load BTC address.
 
         Note: At the moment, it allows only one BTC address to be loaded.
 
         Args:
         - addr_path: Path to file with Bitcoin Address.
+        - session: Session to use, by default one shared by all instances
         """
 
         self.load_key(None, addr_path)
-        self.session = requests.Session()
+        self.session = session or Api._get_shared_session()
 
     def _sign(self):
         """ Not applicable for BlockchainExplorer Api."""
         pass
 
-    def get_balance(self) -> pd.DataFrame:
+    def get_balance(self) -> list:
         """ Get amount of BTC at address."""
         method = 'addressbalance'
         url = f'{Blockchain.uri}{method}/{self.address}'
@@ -520,8 +858,8 @@ class Blockchain(Api):
             response.raise_for_status()
 
         balance = {}
-        balance['BTC'] = [(float(response.text)/1e8)] + [0, 0]
+        balance['BTC'] = [(float(response.content)/1e8)] + [0, 0]
 
-        self.balance = Api._balance_to_dataframe(balance, 'Blockchain')
+        self.balance = Api._balance_records(balance, 'Blockchain')
         return self.balance
 
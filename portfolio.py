@@ -1,15 +1,28 @@
 #!/usr/bin/env python3
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 import pandas as pd
 
-from apis import Kraken, Bitfinex, Etherscan, Blockchain
+from apis import Api, Kraken, Bitfinex, Etherscan, Blockchain
 from datetime import datetime
+import time
 
 BASE_FIATS = {'USD', 'EUR'}
 BASE_CRYPTOS = {'BTC', 'ETH'}
-API_SOURCES = {'Kraken', 'Bitfinex', 'Etherscan', 'Blockchain'}
+API_REGISTRY = {'Kraken': Kraken, 'Bitfinex': Bitfinex,
+                'Etherscan': Etherscan, 'Blockchain': Blockchain}
+API_SOURCES = frozenset(API_REGISTRY)
+_ADDRESS_APIS = frozenset(('Etherscan', 'Blockchain'))
+BALANCE_FORMATTERS = {'Amount': '{:,.2f}'.format, 'price_f': '{:,.2f}'.format,
+                      'price_c': '{:,.4f}'.format, 'value_f': '{:,.2f}'.format,
+                      'value_c': '{:,.2f}'.format}
 
 
 class Portfolio(object):
+    'Seconds during which a fetched balance is reused by get_balance'
+    balance_ttl = 60
+
     def __init__(self, apis: set, base_fiat: str, base_crypto: str='',
                  ref_api: str='') -> None:
         ''' Initialize Portfolio with basic information and checking.
@@ -22,57 +35,63 @@ class Portfolio(object):
         '''
 
         base_fiat = base_fiat.upper()
-        assert base_fiat in BASE_FIATS
+        if base_fiat not in BASE_FIATS:
+            raise ValueError(f'base_fiat {base_fiat} not in {BASE_FIATS}')
         self.base_fiat = base_fiat
 
         base_crypto = base_crypto.upper()
-        if base_crypto:
-            assert base_crypto in BASE_CRYPTOS
+        if base_crypto and base_crypto not in BASE_CRYPTOS:
+            raise ValueError(f'base_crypto {base_crypto} not in {BASE_CRYPTOS}')
         self.base_crypto = base_crypto
 
-        for api_source in apis:
-            assert api_source[0].capitalize() in API_SOURCES
+        unknown = {api[0].capitalize() for api in apis} - API_SOURCES
+        if unknown:
+            raise ValueError(f'Unknown API(s): {unknown}')
 
         if ref_api:
             self.ref_api = ref_api.capitalize()
-            assert self.ref_api in API_SOURCES
+            if self.ref_api not in API_SOURCES:
+                raise ValueError(f'ref_api {ref_api} not in {sorted(API_SOURCES)}')
         else:
             print('WARNING - ref_api not set')
             print('ref_api set by default to Kraken')
             self.ref_api = 'Kraken'
 
-        # Initialize each API (one file only)
-        api_sources = [eval(api[0].capitalize())(api[1]) 
-                       for api in apis if len(api) == 2]
+        # Initialize each API with its file(s)
+        self.api_sources = [API_REGISTRY[api[0].capitalize()](*api[1:])
+                            for api in apis]
 
-        # Case where constructor has two files
-        for api in apis:
-            if len(api) == 3:
-                api_sources.append(eval(api[0].capitalize())(api[1], api[2]))
-        self.api_sources = api_sources
-
-        columns = ['Asset', 'Amount', 'price_f', 'price_c']
-        self.balance = pd.DataFrame(columns = columns)
+        # Balance is built in one go by get_balance, None until then
+        self.balance = None
+        self._balance_time = None
 
     def get_balance(self) -> pd.DataFrame:
-        ''' Get balance of holdings from different APIs.'''
-        
-        # Get balance for different APIs
-        for api_source in self.api_sources:
-            # Case for exchanges
-            if api_source.__class__.__name__ != 'Etherscan' \
-            and api_source.__class__.__name__ != 'Blockchain':
-                self.balance = pd.merge(
-                                        api_source.get_balance(self.base_fiat,
-                                                           self.base_crypto),
-                                        self.balance, how='outer')
-            # Case for BTC/ETH addresses
-            else:
-                self.balance = pd.merge(api_source.get_balance(), self.balance,
-                                        how='outer')
-
-        # Set multi-index: API, Asset
-        self.balance.set_index(['API', 'Asset'], inplace=True)
+        ''' Get balance of holdings from different APIs.
+
+        A balance fetched less than balance_ttl seconds ago is returned as is.
+        '''
+        if (self._balance_time is not None
+                and time.monotonic() - self._balance_time < self.balance_ttl):
+            return self.balance
+
+        # Get balance for different APIs concurrently, as they are independent,
+        # gathering records in api_sources order whichever API answers first
+        with ThreadPoolExecutor(max_workers=len(self.api_sources) or 1) as ex:
+            rows = []
+            for records in ex.map(self._fetch_balance, self.api_sources):
+                rows.extend(records)
+
+        # APIs hold records of the same columns: build frame once
+        self.balance = pd.DataFrame.from_records(rows, columns=Api.col_names)
+        # Simple balance is filtered from the previous balance
+        if hasattr(self, 'simple_balance'):
+            del self.simple_balance
+
+        # Set multi-index: API, Asset, lexsorted so that MultiIndex lookups
+        # take the sorted path. Several accounts on the same exchange may hold
+        # the same asset: their amounts are summed, prices being the same
+        self.balance = self.balance.groupby(['API', 'Asset']).agg(
+                {'Amount': 'sum', 'price_f': 'first', 'price_c': 'first'})
 
         # Setting price_c & price_f for Etherscan & Blockchain Explorer
         if 'Etherscan' in self.balance.index:
@@ -80,11 +99,12 @@ class Portfolio(object):
         if 'Blockchain' in self.balance.index:
             self.set_address_prices('Blockchain')
 
-        # Add Fiat and Crypto Values columns
-        self.balance['value_f'] = (self.balance['Amount'] 
-                                   * self.balance['price_f'])
+        # Add Fiat and Crypto Values columns (same index, no alignment needed)
+        amounts = self.balance['Amount'].to_numpy()
+        self.balance['value_f'] = amounts * self.balance['price_f'].to_numpy()
         if self.base_crypto:
-            self.balance['value_c'] = self.balance['Amount'] * self.balance['price_c']
+            self.balance['value_c'] = (amounts
+                                       * self.balance['price_c'].to_numpy())
         else:
             del self.balance['price_c']
 
@@ -93,15 +113,29 @@ class Portfolio(object):
         if self.base_crypto:
             self.total_crypto = self.balance['value_c'].sum()
 
+        self._balance_time = time.monotonic()
         return self.balance
 
+    def _fetch_balance(self, api_source) -> list:
+        ''' Get balance records of holdings from one API.
+
+        Args:
+        - api_source: Initialized API, e.g. Kraken
+        '''
+        # Case for exchanges
+        if not isinstance(api_source, (Etherscan, Blockchain)):
+            return api_source.get_balance(self.base_fiat, self.base_crypto)
+        # Case for BTC/ETH addresses
+        else:
+            return api_source.get_balance()
+
     def print_balance(self) -> None:
         ''' Print a pretty balance.'''
 
         format = ',.2f'
 
         # Check balance exists
-        if self.balance.empty:
+        if self.balance is None:
             self.get_balance()
 
         # Print totals
@@ -113,22 +147,13 @@ class Portfolio(object):
             print(f'Total in {self.base_crypto}: {self.total_crypto:{format}}')
         print()
 
-        # Desc Sort
-        self.balance.sort_values('value_f', ascending=False, inplace=True)
-
-        # Format
-        tmp = self.get_simple_balance().copy()
-
-        col_names = ['Amount', 'price_f', 'value_f', 'value_c']
-        if not self.base_crypto:
-            col_names.pop()
-        for col in col_names:
-            tmp[col] = self.balance[col].map('{:,.2f}'.format)
+        # Desc Sort, for display only: balance stays sorted by index
+        simple_balance = self.get_simple_balance().sort_values(
+                                                'value_f', ascending=False)
 
-        if self.base_crypto:
-            tmp['price_c'] = self.balance['price_c'].map('{:,.4f}'.format)
-
-        print(tmp, end=2*'\n')
+        # Columns absent w/o base_crypto are ignored by to_string
+        print(simple_balance.to_string(formatters=BALANCE_FORMATTERS),
+              end=2*'\n')
 
     def get_simple_balance(self, threshold: float=0.01) -> pd.DataFrame:
         ''' Returns a balance where onlu holdings with a fiat value higher than
@@ -137,43 +162,45 @@ class Portfolio(object):
         Args:
         - threshold: minimum fiat value for asset to be reported
         '''
-        if self.balance.empty:
+        if self.balance is None:
             self.get_balance()
 
         if not hasattr(self, 'simple_balance'):
-            self.simple_balance = self.balance.copy()
             self.simple_balance = self.balance.loc[
                                         self.balance['value_f'] >= threshold]
         return self.simple_balance
 
     def set_address_prices(self, api: str) -> None:
-        ''' Set ETH or BTC address price(s)
+        ''' Set ETH or BTC address price(s) from those of ref_api
 
         Args:
         - api: Either 'Etherscan' or 'Blockchain' (explorer)
         '''
-        if api == 'Etherscan':
-            crypto = 'ETH'
-        elif api == 'Blockchain':
-            crypto = 'BTC'
-        else:
+        if api not in _ADDRESS_APIS:
             raise Exception(f'{api} is not implemented.')
 
-        try:
-            self.balance.loc[(api, crypto)]['price_f'] = (
-                self.balance.loc[(self.ref_api, crypto)]['price_f'])
-            if self.base_crypto == crypto:
-                self.balance.loc[(api, crypto)]['price_c'] = 1
-            else:
-                self.balance.loc[(api, crypto)]['price_c'] = (
-                    self.balance[(self.ref_api, crypto)]['price_c'])
-        except KeyError:
-            ref_api_session = eval(self.ref_api)()
-            price_f, price_c = (
-                ref_api_session.get_price(
-                    crypto, self.base_fiat, self.base_crypto))
-            self.balance.loc[(api, crypto)]['price_f'] = price_f
-            self.balance.loc[(api, crypto)]['price_c'] = price_c
+        columns = ['price_f', 'price_c']
+        rows = self.balance.index.get_level_values('API') == api
+        assets = self.balance.index[rows].get_level_values('Asset')
+
+        # Prices of ref_api holdings, looked up for all assets at once
+        if self.ref_api in self.balance.index:
+            prices = (self.balance.xs(self.ref_api, level='API')[columns]
+                      .reindex(assets))
+        else:
+            prices = pd.DataFrame(index=assets, columns=columns, dtype=float)
+
+        # Assets not held on ref_api are priced by querying it
+        missing = prices.index[prices['price_f'].isna()]
+        if len(missing):
+            ref_api_session = API_REGISTRY[self.ref_api]()
+            for asset in missing:
+                prices.loc[asset] = ref_api_session.get_price(
+                                    asset, self.base_fiat, self.base_crypto)
+        if self.base_crypto in prices.index:
+            prices.loc[self.base_crypto, 'price_c'] = 1
+
+        self.balance.loc[rows, columns] = prices.to_numpy()
 
     def get_risk(self) -> None:
         ''' Print a set of risk measures of portfolio.
@@ -185,91 +212,100 @@ class Portfolio(object):
         if not hasattr(self, 'simple_balance'):
             self.get_simple_balance()
 
-        df = pd.DataFrame()
-        # Get historical close data
-        for api, asset in self.simple_balance.index:
-            if api != 'Etherscan' and api != 'Blockchain' \
-            and asset not in BASE_FIATS:
-                ticker = asset + self.base_fiat
-                method = f"{api}()"
-                idx = api + '-' + asset
-                df[idx] = eval(method).get_history(ticker)['close']
+        # Non-exchange holdings use the history of ref_api
+        sources = {api: self.ref_api if api in _ADDRESS_APIS else api
+                   for api, _ in self.simple_balance.index}
+        # Initialize each API once, whatever its number of assets
+        instances = {api: API_REGISTRY[api]() for api in set(sources.values())}
+
+        # Get historical close data concurrently, one request per source and
+        # asset: address holdings share the series of ref_api's same asset
+        columns = [(api, asset) for api, asset in self.simple_balance.index
+                   if asset not in BASE_FIATS]
+        tasks = list(dict.fromkeys((sources[api], asset)
+                                   for api, asset in columns))
+        with ThreadPoolExecutor(max_workers=min(Api.max_workers,
+                                                len(tasks)) or 1) as ex:
+            closes = dict(zip(tasks, ex.map(
+                    lambda task: instances[task[0]].get_history(
+                        task[1] + self.base_fiat)['close'],
+                    tasks)))
+
+        # Columns aligned in a single pass rather than one insert each
+        df = pd.DataFrame({api + '-' + asset: closes[(sources[api], asset)]
+                           for api, asset in columns})
 
         # DROP NA fo same length of time series (no backfilling)
         print()
         df.dropna(inplace=True)
         print(f'History\'s length: {len(df.index)} days', end=2*'\n')
 
-        # Compute ret in % (not log returns!) and fiat
-        ret = df.pct_change().dropna()
-        ret_7d = df.pct_change(periods=7).dropna()
+        # Compute ret in % (not log returns!) and fiat, on a single float64
+        # panel where each asset's history is contiguous
+        closes = np.asfortranarray(df.to_numpy(dtype=np.float64))
+        ret = closes[1:] / closes[:-1] - 1
+        ret_7d = closes[7:] / closes[:-7] - 1
 
         # Compute 20-days daily volatility, not annualized
-        index = pd.MultiIndex.from_tuples((
-                                        idx.split('-') for idx in ret.columns
-                                        ), names = ['API', 'Asset'])
-        vols = pd.DataFrame(ret.iloc[-21:-1].std().copy(), columns=['vol_pct'])
-        vols.index = index
+        index = df.columns.str.split('-', n=1, expand=True)
+        index.names = ['API', 'Asset']
+        vols = pd.DataFrame({'vol_pct': ret[-21:-1].std(axis=0, ddof=1)},
+                            index=index)
 
         # Compute 20-days daily volatility in fiat value
-        if 'Etherscan' in self.simple_balance.index:
-            vols.loc[('Etherscan', 'ETH'), :] = (
-                vols.loc[(self.ref_api, 'ETH'), :])
-        if 'Blockchain' in self.simple_balance.index:
-            vols.loc[('Blockchain', 'BTC'), :] = (
-                vols.loc[(self.ref_api, 'BTC'), :])
-
-        vols['vol_fiat'] = vols['vol_pct'] * self.simple_balance['value_f']
+        # Fiat values aligned once on the return columns, then bare ndarrays
+        weights = self.simple_balance['value_f'].reindex(vols.index).to_numpy()
+        vols['vol_fiat'] = vols['vol_pct'].to_numpy() * weights
+        # Sorted once weights are taken, as they follow the return columns
+        vols.sort_index(inplace=True)
         print(f'Daily volatility over last 20 days: ', end='')
         print(f'{vols["vol_fiat"].sum():,.2f} {self.base_fiat}', end=2*'\n')
         print(vols, end=2*'\n')
 
-        # Set return values for non-exchange holdings
-        if 'Etherscan' in self.simple_balance.index:
-            ret['Etherscan-ETH'] = ret[self.ref_api + '-ETH']
-            ret_7d['Etherscan-ETH'] = ret_7d[self.ref_api + '-ETH']
-        if 'Blockchain' in self.simple_balance.index:
-            ret['Blockchain-BTC'] = ret[self.ref_api + '-BTC']
-            ret_7d['Blockchain-BTC'] = ret_7d[self.ref_api + '-BTC']
-
         # Compute 1-day and 7-days portfolio fiat p&l
-        tmp = ret.copy()
-        tmp_7d = ret_7d.copy()
-        for idx in self.simple_balance.index:
-            if idx[1] not in BASE_FIATS:
-                idx_ret = '-'.join(idx)
-                tmp[idx_ret] = (
-                    ret[idx_ret] * self.simple_balance.loc[idx, 'value_f'])
-                tmp_7d[idx_ret] = (
-                    ret_7d[idx_ret] * self.simple_balance.loc[idx, 'value_f'])
+        # Weighting and summing over assets fused in one matrix product
+        totals = pd.Series(ret @ weights, index=df.index[1:])
+        totals_7d = pd.Series(ret_7d @ weights, index=df.index[7:])
 
         # Worst/Best days/weeks
-        totals = tmp.sum(axis=1).sort_values()
         print('N.B.: The following uses historical returns applied to today\'s portfolio')
+        worst, best = totals.idxmin(), totals.idxmax()
         print(f'Worst day ', end='')
-        print(f'({totals.iloc[[0]].index[0]:%d/%m/%Y}): ', end='')
-        print(f'{totals.iloc[0]:,.2f} {self.base_fiat} ', end='')
-        print(f'({totals.iloc[0]/self.total_fiat:.2%})')
+        print(f'({worst:%d/%m/%Y}): ', end='')
+        print(f'{totals[worst]:,.2f} {self.base_fiat} ', end='')
+        print(f'({totals[worst]/self.total_fiat:.2%})')
         print(f'Best day ', end='')
-        print(f'({totals.iloc[[-1]].index[0]:%d/%m/%Y}): ', end='')
-        print(f'{totals.iloc[-1]:,.2f} {self.base_fiat} ', end='')
-        print(f'({totals.iloc[-1]/self.total_fiat:.2%})', end=2*'\n')
+        print(f'({best:%d/%m/%Y}): ', end='')
+        print(f'{totals[best]:,.2f} {self.base_fiat} ', end='')
+        print(f'({totals[best]/self.total_fiat:.2%})', end=2*'\n')
 
-        totals_7d = tmp_7d.sum(axis=1).sort_values()
+        worst, best = totals_7d.idxmin(), totals_7d.idxmax()
         print(f'Worst week ', end='')
-        print(f'({totals_7d.iloc[[0]].index[0]:%d/%m/%Y}): ', end='')
-        print(f'{totals_7d.iloc[0]:,.2f} {self.base_fiat} ', end='')
-        print(f'({totals_7d.iloc[0]/self.total_fiat:.2%})')
+        print(f'({worst:%d/%m/%Y}): ', end='')
+        print(f'{totals_7d[worst]:,.2f} {self.base_fiat} ', end='')
+        print(f'({totals_7d[worst]/self.total_fiat:.2%})')
         print(f'Best week ', end='')
-        print(f'({totals_7d.iloc[[-1]].index[0]:%d/%m/%Y}): ', end='')
-        print(f'{totals_7d.iloc[-1]:,.2f} {self.base_fiat} ', end='')
-        print(f'({totals_7d.iloc[-1]/self.total_fiat:.2%})', end=2*'\n')
+        print(f'({best:%d/%m/%Y}): ', end='')
+        print(f'{totals_7d[best]:,.2f} {self.base_fiat} ', end='')
+        print(f'({totals_7d[best]/self.total_fiat:.2%})', end=2*'\n')
         
         # Expected Shortfall 1-day & 7-days at 97.5%
-        es_1d = totals.iloc[:int(len(totals) * 0.025)].mean()
+        es_1d = Portfolio._expected_shortfall(totals.to_numpy())
         print(f'1-day Expected Shortfall @ 97.5%: {es_1d:,.2f} {self.base_fiat}')
-        es_7d = totals_7d.iloc[:int(len(totals_7d) * 0.025)].mean()
+        es_7d = Portfolio._expected_shortfall(totals_7d.to_numpy())
         print(f'7-day Expected Shortfall @ 97.5%: {es_7d:,.2f} {self.base_fiat}',
               end=2*'\n')
 
         return totals, totals_7d
+
+    @staticmethod
+    def _expected_shortfall(pnl: np.ndarray, level: float=0.975) -> float:
+        ''' Return mean of the worst (1 - level) share of p&l, at least one.
+
+        Args:
+        - pnl: historical p&l
+        - level: confidence level
+        '''
+        # Partial selection of the tail, no full sort needed
+        k = max(1, int(len(pnl) * (1 - level)))
+        return np.partition(pnl, k - 1)[:k].mean()